@@ -1 +1,36 @@
-__all__ = []
+from safe_fs_snapshot.api import (
+    create_snapshot_async,
+    diff_async,
+    load_snapshot_async,
+    save_snapshot_async,
+    scan_async,
+)
+from safe_fs_snapshot.diff import Change, iter_changes
+from safe_fs_snapshot.errors import (
+    InvalidDirectoryError,
+    InvalidSnapshotNameError,
+    ScanCancelledError,
+    SnapshotError,
+    SnapshotNotFoundError,
+)
+from safe_fs_snapshot.snapshot import ScanProgress, create_snapshot, load_snapshot
+from safe_fs_snapshot.traversal import TraversalPolicy
+
+__all__ = [
+    "Change",
+    "InvalidDirectoryError",
+    "InvalidSnapshotNameError",
+    "ScanCancelledError",
+    "ScanProgress",
+    "SnapshotError",
+    "SnapshotNotFoundError",
+    "TraversalPolicy",
+    "create_snapshot",
+    "create_snapshot_async",
+    "diff_async",
+    "iter_changes",
+    "load_snapshot",
+    "load_snapshot_async",
+    "save_snapshot_async",
+    "scan_async",
+]
@@ -0,0 +1,233 @@
+"""
+api.py - Asyncio library API
+
+For embedding the scanner in an asyncio service. Nothing here prints or exits:
+problems are raised as the exceptions in errors.py, unreadable entries are
+reported through on_warning, and progress through on_progress.
+
+    async for entry in scan_async(Path("/srv/data")):
+        ...
+
+    files = await create_snapshot_async(Path("/srv/data"), on_progress=report)
+    await save_snapshot_async(files, Path("/srv/data"), "nightly")
+    data = await load_snapshot_async("nightly")
+
+    async for change in diff_async("golden", "nightly"):
+        if change.kind != "unchanged":
+            ...
+
+Filesystem work runs in a bounded thread pool (max_workers directories are listed
+at once) and long loops hand control back to the event loop every YIELD_EVERY
+items, so the loop is never stuck behind a big directory or snapshot.
+Loading reads the snapshot's index file in a thread and decodes it on the loop
+DECODE_CHUNK records per json.loads call, which keeps the sync path's speed.
+Cancel the task that runs any of these to stop them; in-flight work is dropped.
+The scan functions take a traversal.TraversalPolicy for symlinks and mounts.
+"""
+
+import asyncio
+import heapq
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from safe_fs_snapshot import index
+from safe_fs_snapshot.diff import Change, iter_path_checks, to_dictionary
+from safe_fs_snapshot.snapshot import DirectoryScan, ScanProgress, scan_directory, verify_directory, write_snapshot
+from safe_fs_snapshot.traversal import (
+    ScanRoot,
+    TraversalPolicy,
+    VisitedDirectories,
+    hardlink_order,
+    mark_hardlinks,
+    prepare_scan,
+)
+
+DEFAULT_SCAN_WORKERS = 8
+YIELD_EVERY = 1000  # items processed between trips back to the event loop
+DECODE_CHUNK = 1000  # snapshot records decoded per json.loads call when loading
+
+
+# list one directory in a worker thread, sorting its files there so the event loop doesn't have to
+def _scan_directory_sorted(current_dir: Path, root: ScanRoot):
+    result = scan_directory(current_dir, root)
+    result.files.sort(key=lambda f: f["relative_path"])
+    return result
+
+
+# walk a directory tree, yielding each directory's DirectoryScan (files sorted) as one batch
+async def _scan_batches(
+    directory: Path,
+    policy: TraversalPolicy | None,
+    max_workers: int,
+    on_progress: Callable[[ScanProgress], None] | None,
+    on_warning: Callable[[str], None] | None,
+) -> AsyncIterator[DirectoryScan]:
+    loop = asyncio.get_running_loop()
+    # even these touch the disk, so they go to a thread too
+    await asyncio.to_thread(verify_directory, directory)
+    root_dir = await asyncio.to_thread(directory.resolve)
+    root = await asyncio.to_thread(prepare_scan, root_dir, policy or TraversalPolicy())
+    # only this coroutine touches visited, so worker threads never need a lock
+    visited = VisitedDirectories(root)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="safe-fs-scan")
+    to_scan = [root_dir]
+    pending = set()
+    progress = ScanProgress()
+    try:
+        while to_scan or pending or visited.has_linked:
+            if not to_scan and not pending:
+                # everything reachable without symlinks is done; now the next symlinked directory.
+                # one at a time, so which name a directory is recorded under doesn't depend on timing
+                linked_dir, skipped = visited.pop_linked()
+                if on_warning is not None:
+                    for message in skipped:
+                        on_warning(message)
+                if linked_dir is None:
+                    break
+                to_scan.append(linked_dir)
+
+            # keep at most max_workers directories in flight (depth-first, like create_snapshot)
+            while to_scan and len(pending) < max_workers:
+                pending.add(loop.run_in_executor(executor, _scan_directory_sorted, to_scan.pop(), root))
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                to_scan.extend(visited.filter_new(result))
+
+                if on_warning is not None:
+                    for message in result.warnings:
+                        on_warning(message)
+                if on_progress is not None:
+                    progress.directories_scanned += 1
+                    progress.files_found += len(result.files)
+                    progress.current_directory = result.directory
+                    # a copy each time, so callers can keep it or hand it to another task
+                    on_progress(replace(progress))
+
+                yield result
+    finally:
+        # runs on cancellation too: drop queued directories and don't wait for running ones
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# yield every file entry under directory, in no particular order.
+# with several names for one inode, the first one yielded keeps the full entry
+async def scan_async(
+    directory: Path,
+    policy: TraversalPolicy | None = None,
+    max_workers: int = DEFAULT_SCAN_WORKERS,
+    on_progress: Callable[[ScanProgress], None] | None = None,
+    on_warning: Callable[[str], None] | None = None,
+) -> AsyncIterator[dict]:
+    count = 0
+    hardlinks_seen = {}
+    async for result in _scan_batches(directory, policy, max_workers, on_progress, on_warning):
+        mark_hardlinks(result.hardlink_candidates, hardlinks_seen)
+        for file_entry in result.files:
+            yield file_entry
+            count += 1
+            if count % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+
+
+# async version of snapshot.create_snapshot: the full files list, sorted by relative_path
+async def create_snapshot_async(
+    directory: Path,
+    policy: TraversalPolicy | None = None,
+    max_workers: int = DEFAULT_SCAN_WORKERS,
+    on_progress: Callable[[ScanProgress], None] | None = None,
+    on_warning: Callable[[str], None] | None = None,
+) -> list:
+    batches = []
+    hardlink_candidates = []
+    async for result in _scan_batches(directory, policy, max_workers, on_progress, on_warning):
+        batches.append(result.files)
+        hardlink_candidates.extend(result.hardlink_candidates)
+
+    # every batch is already sorted, so a merge (in a thread) is all that's left
+    return await asyncio.to_thread(_merge_batches, batches, hardlink_candidates)
+
+
+# runs in a thread: merge the sorted batches and mark hardlinks the same way create_snapshot does
+def _merge_batches(batches: list, hardlink_candidates: list) -> list:
+    hardlink_candidates.sort(key=hardlink_order)
+    mark_hardlinks(hardlink_candidates, {})
+    return list(heapq.merge(*batches, key=lambda f: f["relative_path"]))
+
+
+# async version of snapshot.write_snapshot (also builds the snapshot's index)
+async def save_snapshot_async(snapshot: list, scanned_directory: Path, snapshot_name: str):
+    await asyncio.to_thread(write_snapshot, snapshot, scanned_directory, snapshot_name)
+
+
+# runs in a thread: read the index's records in one go, plus the byte offset of every
+# DECODE_CHUNK-th record so the decoding can be split into short steps. the records are read
+# from the file rather than copied out of the mmap, because a file read releases the GIL
+def _read_records(snapshot_name: str) -> tuple[dict, bytes, list]:
+    with index.open_index(snapshot_name) as snapshot_index:
+        records = (index.get_index_dir(snapshot_name) / "records.jsonl").read_bytes()
+        bounds = snapshot_index.offsets[::DECODE_CHUNK].tolist() + [len(records)]
+        return snapshot_index.meta, records, bounds
+
+
+# decode the records DECODE_CHUNK at a time on the event loop, yielding a list of entries per chunk.
+# each chunk becomes one JSON array (a newline never appears inside a record), so one json.loads
+# call handles it at full speed, and the loop gets a turn between chunks
+async def _decode_records(records: bytes, bounds: list) -> AsyncIterator[list]:
+    for start, end in zip(bounds, bounds[1:]):
+        chunk = records[start:end].rstrip(b"\n").replace(b"\n", b",")
+        yield json.loads(b"[" + chunk + b"]")
+        await asyncio.sleep(0)
+
+
+# async version of snapshot.load_snapshot: the wrapper dict with files sorted by relative_path
+async def load_snapshot_async(snapshot_name: str) -> dict:
+    meta, records, bounds = await asyncio.to_thread(_read_records, snapshot_name)
+    files = []
+    async for chunk in _decode_records(records, bounds):
+        files.extend(chunk)
+    return {
+        "scanned_directory": meta["scanned_directory"],
+        "created_at": meta["created_at"],
+        "files_count": meta["files_count"],
+        "files": files,
+    }
+
+
+# load a snapshot straight into the path -> entry dictionary that diffing needs
+async def _load_files_dict_async(snapshot_name: str) -> dict:
+    _, records, bounds = await asyncio.to_thread(_read_records, snapshot_name)
+    files_dict = {}
+    async for chunk in _decode_records(records, bounds):
+        files_dict.update(to_dictionary(chunk))
+    return files_dict
+
+
+# yield a diff.Change for every path in either snapshot (see diff.iter_changes for the order)
+async def diff_async(snapshot1: str, snapshot2: str) -> AsyncIterator[Change]:
+    # one after the other: decoding is CPU work, so running both at once only makes the loop wait longer
+    snap1_dict = await _load_files_dict_async(snapshot1)
+    snap2_dict = await _load_files_dict_async(snapshot2)
+
+    # count every path looked at, not just the ones yielded: when few paths were added,
+    # the pass over snapshot2 would otherwise run to the end without giving the loop a turn
+    for count, change in enumerate(iter_path_checks(snap1_dict, snap2_dict), start=1):
+        if change is not None:
+            yield change
+        if count % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+
+    # freeing a dict frees all of its entries in one go (tens of ms for a few hundred thousand),
+    # so empty them a chunk at a time instead of letting them drop when this generator ends
+    for files_dict in (snap1_dict, snap2_dict):
+        while files_dict:
+            for _ in range(min(YIELD_EVERY, len(files_dict))):
+                files_dict.popitem()
+            await asyncio.sleep(0)
@@ -4,16 +4,29 @@ cli.py - Command-Line Interface (entry point)
 Runs when a user types: python -m safe_fs_snapshot.cli <command>
 Example commands:
     python -m safe_fs_snapshot.cli scan ./my_project
+    python -m safe_fs_snapshot.cli scan / --one-file-system
     python -m safe_fs_snapshot.cli list
     python -m safe_fs_snapshot.cli diff before-update after-update
     python -m safe_fs_snapshot.cli show before-update
+    python -m safe_fs_snapshot.cli query before-update --glob "logs/**" --min-size 1G
 """
 
 import argparse  # Built-in module for reading command-line arguments
+import asyncio
 from pathlib import Path  # Object-oriented filesystem paths
+from safe_fs_snapshot import api
 from safe_fs_snapshot import snapshot
 from safe_fs_snapshot import diff
-from datetime import datetime
+from safe_fs_snapshot import index
+from safe_fs_snapshot.errors import SnapshotError
+from safe_fs_snapshot.traversal import TraversalPolicy
+from datetime import datetime, timedelta
+
+# multipliers for --min-size / --max-size suffixes (1K = 1024 bytes)
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+# multipliers for --newer-than suffixes (7d = 7 days)
+AGE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
 
 
 def main() -> int:
@@ -58,6 +71,31 @@ def main() -> int:
     # add an optional flag for "scan" argument, --name (what you want to name the snapshot file)
     scan_parser.add_argument("--name", help="Name for this snapshot")
 
+    # traversal policy flags (see traversal.py)
+    scan_parser.add_argument(
+        "--one-file-system",
+        action="store_true",
+        help="Don't descend into directories on other filesystems",
+    )
+    follow_group = scan_parser.add_mutually_exclusive_group()
+    follow_group.add_argument(
+        "--follow-symlinks",
+        dest="follow_symlinks",
+        action="store_true",
+        help="Scan through symlinks (loops are detected and skipped)",
+    )
+    follow_group.add_argument(
+        "--no-follow",
+        dest="follow_symlinks",
+        action="store_false",
+        help="Record symlinks as symlink entries (default)",
+    )
+    scan_parser.add_argument(
+        "--scan-pseudo-filesystems",
+        action="store_true",
+        help="Also descend into proc, sysfs, cgroup, ... mounts (skipped by default)",
+    )
+
     # =============================================
     # LIST subparser (specialist #2)
     # =============================================
@@ -70,15 +108,24 @@ def main() -> int:
     # =============================================
     # Needs TWO arguments: the names of the two snapshots to compare.
     # Example: safe-fs-snapshot diff before-update after-update
+    # With --baseline, every name is compared against the baseline instead.
+    # Example: safe-fs-snapshot diff --baseline golden host-a host-b host-c
     diff_parser = subparsers.add_parser("diff", help="Compare two snapshots")
 
     diff_parser.add_argument(
-        "name1",
-        help="Name of the first snapshot",
+        "names",
+        nargs="+",
+        metavar="name",
+        help="Names of the two snapshots (or the targets when using --baseline)",
     )
+    diff_parser.add_argument("--baseline", help="Compare every target against this snapshot")
+    diff_parser.add_argument("--detail", action="store_true", help="With --baseline, list each target's changes")
+    diff_parser.add_argument("--jobs", type=int, help="With --baseline, number of worker processes")
     diff_parser.add_argument(
-        "name2",
-        help="Name of the second snapshot",
+        "--cache-mb",
+        type=int,
+        default=diff.DEFAULT_CACHE_MB,
+        help="With --baseline, memory budget for decoded snapshots across all worker processes, in MB",
     )
 
     # =============================================
@@ -92,6 +139,20 @@ def main() -> int:
         "name",
         help="Name of the snapshot to view",
     )
+    add_query_arguments(show_parser)
+
+    # =============================================
+    # QUERY subparser (specialist #5)
+    # =============================================
+    # Like show, but prints only the matching files (with their modified time).
+    # Example: safe-fs-snapshot query before-update --top 10 --by size
+    query_parser = subparsers.add_parser("query", help="Find files in a snapshot")
+
+    query_parser.add_argument(
+        "name",
+        help="Name of the snapshot to search",
+    )
+    add_query_arguments(query_parser)
 
     # =============================================
     # PARSE & ROUTE
@@ -106,15 +167,34 @@ def main() -> int:
         parser.print_help()
         return 0
 
+    # Library code raises SnapshotError subclasses instead of exiting; report them here.
+    try:
+        return run_command(args, diff_parser)
+    except SnapshotError as e:
+        print(f"Error: {e}")
+        return 1
+
+
+# run the subcommand the user typed. returns the exit code
+def run_command(args: argparse.Namespace, diff_parser: argparse.ArgumentParser) -> int:
     # Route to the right function based on which command was typed.
     # This is the if/elif chain we talked about!
     if args.command == "scan":
-        # create a snapshot of the directory
-        files_list = snapshot.create_snapshot(args.directory_to_scan)
+        # create a snapshot of the directory (the async API lists directories in parallel threads)
+        policy = TraversalPolicy(
+            one_file_system=args.one_file_system,
+            follow_symlinks=args.follow_symlinks,
+            skip_pseudo_filesystems=not args.scan_pseudo_filesystems,
+        )
+        files_list = asyncio.run(
+            api.create_snapshot_async(args.directory_to_scan, policy, on_warning=print_warning)
+        )
 
         # if user didnt specify a name, auto-generate one from directory + timestamp
         if args.name is None:
-            auto_name = f"{args.directory_to_scan}_{datetime.now().strftime('%Y_%b_%d_%I.%M%p')}"
+            # path separators can't go in a snapshot name, so "/tmp/x" becomes "tmp_x"
+            directory_part = args.directory_to_scan.as_posix().strip("/").replace("/", "_") or "root"
+            auto_name = f"{directory_part}_{datetime.now().strftime('%Y_%b_%d_%I.%M%p')}"
             snapshot.write_snapshot(files_list, args.directory_to_scan, auto_name)
             print(f"Snapshot saved: {auto_name} ({len(files_list)} files)")
         else:
@@ -125,16 +205,107 @@ def main() -> int:
         snapshot.list_snapshots()
 
     elif args.command == "diff":
-        print(f"Comparing: {args.name1} vs {args.name2}")
-        print()
-        diff.compare_snapshots(args.name1, args.name2)
+        if args.baseline is not None:
+            diff.compare_to_baseline(args.baseline, args.names, args.detail, args.jobs, args.cache_mb)
+        elif len(args.names) != 2:
+            diff_parser.error("expected exactly two snapshot names (or use --baseline)")
+        else:
+            name1, name2 = args.names
+            # collect the changes first so a missing snapshot is reported before any output
+            changes = asyncio.run(collect_changes(name1, name2))
+            print(f"Comparing: {name1} vs {name2}")
+            print()
+            diff.print_changes(diff.group_changes(changes))
 
     elif args.command == "show":
-        snapshot.show_snapshot(args.name)
+        snapshot.show_snapshot(args.name, build_query(args))
+
+    elif args.command == "query":
+        snapshot.query_snapshot(args.name, build_query(args))
 
     return 0
 
 
+# every change between two snapshots, from the library's diff_async
+async def collect_changes(snapshot1: str, snapshot2: str) -> list:
+    return [change async for change in api.diff_async(snapshot1, snapshot2)]
+
+
+# unreadable files/directories are reported but don't stop a scan
+def print_warning(message: str):
+    print(f"WARNING: {message}")
+
+
+# filter and pagination flags shared by "show" and "query"
+def add_query_arguments(subparser: argparse.ArgumentParser):
+    subparser.add_argument("--prefix", help="Only files whose path starts with this")
+    subparser.add_argument("--glob", help='Only files matching this pattern, e.g. "logs/**"')
+    subparser.add_argument("--min-size", type=parse_size, help="Minimum size, e.g. 500K, 1G")
+    subparser.add_argument("--max-size", type=parse_size, help="Maximum size, e.g. 500K, 1G")
+    subparser.add_argument(
+        "--newer-than",
+        type=parse_age,
+        help="Only files modified after this: an age (30m, 2h, 7d) or a date (2026-02-07)",
+    )
+    subparser.add_argument("--top", type=non_negative_int, help="Only the N largest files (see --by)")
+    subparser.add_argument("--by", choices=["size", "mtime"], default="size", help="What --top ranks by")
+    subparser.add_argument("--offset", type=non_negative_int, default=0, help="Skip this many results")
+    subparser.add_argument("--limit", type=non_negative_int, help="Show at most this many results")
+
+
+# turn the parsed flags into an index.Query
+def build_query(args: argparse.Namespace) -> index.Query:
+    return index.Query(
+        prefix=args.prefix,
+        glob=args.glob,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        newer_than=args.newer_than,
+        top=args.top,
+        by=args.by,
+        offset=args.offset,
+        limit=args.limit,
+    )
+
+
+# --top / --offset / --limit: a count, so negative numbers are rejected
+def non_negative_int(text: str) -> int:
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {text!r}")
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more: {text!r}")
+    return value
+
+
+# "1G" -> 1073741824. plain numbers are bytes
+def parse_size(text: str) -> int:
+    cleaned = text.strip().upper().removesuffix("IB").removesuffix("B") or "0"
+    unit = cleaned[-1] if cleaned[-1] in SIZE_UNITS else ""
+    number = cleaned[: len(cleaned) - len(unit)]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+
+
+# "7d" -> unix timestamp 7 days ago. an ISO date/time is used as-is
+def parse_age(text: str) -> float:
+    unit = text[-1:].lower()
+    if unit in AGE_UNITS:
+        try:
+            return (datetime.now() - timedelta(**{AGE_UNITS[unit]: float(text[:-1])})).timestamp()
+        except ValueError:
+            pass
+        except OverflowError:
+            raise argparse.ArgumentTypeError(f"age out of range: {text!r}")
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f"invalid age or date: {text!r}")
+
+
 # Runs main() only when executed directly (not when imported).
 # raise SystemExit passes the exit code to the OS.
 if __name__ == "__main__":
@@ -1,5 +1,37 @@
+"""
+diff.py - Comparing snapshots
+
+iter_changes() yields a Change for every path in two snapshots and prints nothing;
+the CLI's pair diff gets them through api.diff_async and prints them with print_changes.
+compare_to_baseline(base, targets) compares one baseline against many targets and
+prints a summary matrix.
+
+Decoded snapshots (already turned into path -> entry dictionaries) are kept in an
+LRU cache so the same snapshot is only parsed once. In baseline mode the baseline
+is decoded once in the main process and handed to each worker process when it starts.
+Workers decode each target once and drop it, so only the main process caches. The
+matrix only needs counts, so paths are only sorted and listed with --detail.
+
+--cache-mb is a budget for the whole run: the cached snapshots in the main process,
+plus one baseline copy and one target per worker. Fewer workers are started when
+the budget can't hold that many.
+"""
+
 import json
-from safe_fs_snapshot.storage import get_storage_dir, verify_snapshot_file
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from safe_fs_snapshot.storage import snapshot_path, verify_snapshot_file
+
+DEFAULT_CACHE_MB = 512
+# decoded dictionaries take about 3x the size of the snapshot JSON on disk
+# (measured: 25 MB of JSON -> 77 MB of dicts for 200k entries)
+DECODED_SIZE_FACTOR = 3
+
+# baseline dictionary inside a worker process (set once by init_worker)
+_worker_baseline = None
 
 
 # convert a files list of dict, to a dict of dict (keys are the paths)
@@ -13,61 +45,266 @@ def to_dictionary(files_list: list) -> dict:
     return files_dict
 
 
-# input the name of the snapshots, output the comparison dictionary
-# compare 2 snapshots by getting the common, deleted, and added files. also compare the files that are in common
-def compare_snapshots(snapshot1: str, snapshot2: str):
-    snapshot1_file_path = get_storage_dir() / f"{snapshot1}.json"
-    snapshot2_file_path = get_storage_dir() / f"{snapshot2}.json"
-    # check if that snapshot actually
-    verify_snapshot_file(snapshot1_file_path)
-    verify_snapshot_file(snapshot2_file_path)
-
-    # open the first snapshot and store it
-    with open(snapshot1_file_path, "r") as f:
-        snap1_data = json.load(f)
-        snap1_files = snap1_data["files"]
-
-    # open the second snapshot and store it
-    with open(snapshot2_file_path, "r") as f:
-        snap2_data = json.load(f)
-        snap2_files = snap2_data["files"]
-
-    # convert both lists to dictionary so its easier to compare them
-    snap1_dict = to_dictionary(snap1_files)
-    snap2_dict = to_dictionary(snap2_files)
-
-    file_changes(snap1_dict, snap2_dict)
-
-
-# compare the size of the common files of the snapshots
-def file_changes(snap1_dict: dict, snap2_dict: dict):
-    deleted_files = snap1_dict.keys() - snap2_dict.keys()
-    added_files = snap2_dict.keys() - snap1_dict.keys()
-    common_files = snap1_dict.keys() & snap2_dict.keys()
-
-    # print all the deleted files
-    for deleted_file in deleted_files:
-        print(f"- {deleted_file}")
-
-    # print all the added files
-    for added_file in added_files:
-        print(f"+ {added_file}")
-
-    changed_files = []
-    unchanged_files = []
-    for file_path in common_files:
-        if snap1_dict[file_path] != snap2_dict[file_path]:
-            changed_files.append(file_path)
-            print(
-                f"~ {file_path} (size: {snap1_dict[file_path]['size']} -> {snap2_dict[file_path]['size']})"
-            )
+# read a snapshot JSON and decode it into a files dictionary (no caching)
+def load_files_dict(snapshot_name: str) -> dict:
+    snapshot_file_path = snapshot_path(snapshot_name)
+    # check if that snapshot actually exists
+    verify_snapshot_file(snapshot_file_path)
+    with open(snapshot_file_path, "r") as f:
+        return to_dictionary(json.load(f)["files"])
+
+
+# estimated memory used by a snapshot once decoded, from the size of its JSON file
+def decoded_cost(snapshot_name: str) -> int:
+    return snapshot_path(snapshot_name).stat().st_size * DECODED_SIZE_FACTOR
+
+
+# LRU cache of decoded snapshots (name -> files dictionary), bounded by an estimate of memory use
+class SnapshotCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._entries = OrderedDict()  # name -> (files_dict, cost), oldest first
+
+    def get(self, snapshot_name: str) -> dict:
+        if snapshot_name in self._entries:
+            self._entries.move_to_end(snapshot_name)
+            return self._entries[snapshot_name][0]
+
+        files_dict = load_files_dict(snapshot_name)
+        cost = decoded_cost(snapshot_name)
+        self._entries[snapshot_name] = (files_dict, cost)
+        self.used_bytes += cost
+        # evict least recently used snapshots, but always keep the one just loaded
+        while self.used_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_cost) = self._entries.popitem(last=False)
+            self.used_bytes -= evicted_cost
+        return files_dict
+
+    # cost of a cached snapshot (0 if it isn't cached)
+    def cost(self, snapshot_name: str) -> int:
+        entry = self._entries.get(snapshot_name)
+        return 0 if entry is None else entry[1]
+
+
+# shared by every baseline comparison in this process
+snapshot_cache = SnapshotCache()
+
+
+# one difference between two snapshots. old/new are the file entries (None when missing)
+@dataclass
+class Change:
+    kind: str  # "added", "deleted", "changed" or "unchanged"
+    path: str
+    old: dict | None
+    new: dict | None
+
+
+# yield a Change for every path in either snapshot: first the paths in snap1 (in its order),
+# then the paths only in snap2. nothing is built up front, so this can be consumed lazily
+def iter_changes(snap1_dict: dict, snap2_dict: dict) -> Iterator[Change]:
+    for change in iter_path_checks(snap1_dict, snap2_dict):
+        if change is not None:
+            yield change
+
+
+# like iter_changes, but also yields None for each snap2 path that turned out to be in snap1,
+# so callers that need to pause every N steps (api.diff_async) get a step for every path looked at
+def iter_path_checks(snap1_dict: dict, snap2_dict: dict) -> Iterator[Change | None]:
+    for file_path, old_entry in snap1_dict.items():
+        new_entry = snap2_dict.get(file_path)
+        if new_entry is None:
+            yield Change("deleted", file_path, old_entry, None)
+        elif old_entry != new_entry:
+            yield Change("changed", file_path, old_entry, new_entry)
         else:
-            unchanged_files.append(file_path)
-            print(f"  {file_path}")
+            yield Change("unchanged", file_path, old_entry, new_entry)
+
+    for file_path, new_entry in snap2_dict.items():
+        if file_path not in snap1_dict:
+            yield Change("added", file_path, None, new_entry)
+        else:
+            yield None
+
+
+# sort Change objects into {kind: [Change, ...]}, each list in path order
+def group_changes(changes: Iterable[Change]) -> dict:
+    grouped = {"added": [], "deleted": [], "changed": [], "unchanged": []}
+    for change in changes:
+        grouped[change.kind].append(change)
+
+    for kind_changes in grouped.values():
+        kind_changes.sort(key=lambda c: c.path)
+    return grouped
+
+
+# how many paths were added, deleted, changed, and unchanged. set operations on the keys,
+# with no Change objects or sorting, since the baseline matrix only shows the counts
+def count_changes(snap1_dict: dict, snap2_dict: dict) -> dict:
+    common = snap1_dict.keys() & snap2_dict.keys()
+    changed = sum(1 for file_path in common if snap1_dict[file_path] != snap2_dict[file_path])
+    return {
+        "added": len(snap2_dict) - len(common),
+        "deleted": len(snap1_dict) - len(common),
+        "changed": changed,
+        "unchanged": len(common) - changed,
+    }
+
+
+# work out which paths were added, deleted, changed, and unchanged between two snapshots
+def find_changes(snap1_dict: dict, snap2_dict: dict) -> dict:
+    grouped = group_changes(iter_changes(snap1_dict, snap2_dict))
+    return {kind: [c.path for c in kind_changes] for kind, kind_changes in grouped.items()}
+
+
+# print one line per file ("-" deleted, "+" added, "~" changed, " " unchanged), then a summary line.
+# grouped is what group_changes returns
+def print_changes(grouped: dict, show_unchanged: bool = True):
+    for change in grouped["deleted"]:
+        print(f"- {change.path}")
+
+    for change in grouped["added"]:
+        print(f"+ {change.path}")
+
+    for change in grouped["changed"]:
+        print(f"~ {change.path} (size: {change.old['size']} -> {change.new['size']})")
+
+    if show_unchanged:
+        for change in grouped["unchanged"]:
+            print(f"  {change.path}")
 
     # print summary line
     print()
     print(
-        f"Summary: {len(added_files)} added, {len(deleted_files)} deleted, "
-        f"{len(changed_files)} changed, {len(unchanged_files)} unchanged"
+        f"Summary: {len(grouped['added'])} added, {len(grouped['deleted'])} deleted, "
+        f"{len(grouped['changed'])} changed, {len(grouped['unchanged'])} unchanged"
     )
+
+
+# runs once in each worker process: keep the already-decoded baseline for every target it compares
+def init_worker(baseline_dict: dict | None):
+    global _worker_baseline
+    _worker_baseline = baseline_dict
+
+
+# compare one target against the worker's baseline. detail lines are rendered here so only text goes back.
+# the target is decoded here and dropped afterwards: each target is compared exactly once, so caching it wouldn't help
+def compare_target(target: str, detail: bool) -> tuple[str, dict, list]:
+    target_dict = load_files_dict(target)
+    counts = count_changes(_worker_baseline, target_dict)
+
+    lines = []
+    if detail:
+        base_paths = _worker_baseline.keys()
+        target_paths = target_dict.keys()
+        changed = [p for p in base_paths & target_paths if _worker_baseline[p] != target_dict[p]]
+        lines += [f"- {p}" for p in sorted(base_paths - target_paths)]
+        lines += [f"+ {p}" for p in sorted(target_paths - base_paths)]
+        lines += [
+            f"~ {p} (size: {_worker_baseline[p]['size']} -> {target_dict[p]['size']})" for p in sorted(changed)
+        ]
+    return target, counts, lines
+
+
+# how many worker processes fit in what's left of the cache budget. each worker holds
+# a copy of the baseline plus the target it is comparing; fewer than 2 means run in this process
+def workers_within_budget(jobs: int, baseline_cost: int, largest_target_cost: int) -> int:
+    per_worker = baseline_cost + largest_target_cost
+    available = snapshot_cache.max_bytes - snapshot_cache.used_bytes
+    if per_worker > 0:
+        jobs = min(jobs, available // per_worker)
+    return jobs if jobs >= 2 else 1
+
+
+# compare one baseline against many targets. returns the decoded baseline, one
+# (target, counts, detail lines) tuple per target in the order given, and a note for the
+# user when the cache budget forced fewer workers than asked for (None otherwise)
+def baseline_results(
+    baseline: str,
+    targets: list,
+    detail: bool = False,
+    jobs: int | None = None,
+    cache_mb: int = DEFAULT_CACHE_MB,
+) -> tuple[dict, list, str | None]:
+    # fail before starting any workers if a snapshot is missing
+    for snapshot_name in [baseline, *targets]:
+        verify_snapshot_file(snapshot_path(snapshot_name))
+
+    snapshot_cache.max_bytes = cache_mb * 1024 * 1024
+    baseline_dict = snapshot_cache.get(baseline)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    wanted = jobs = max(1, min(jobs, len(targets)))
+    budget_note = None
+    if jobs > 1:
+        baseline_cost = snapshot_cache.cost(baseline)
+        largest_target_cost = max(decoded_cost(target) for target in targets)
+        jobs = workers_within_budget(jobs, baseline_cost, largest_target_cost)
+        if jobs < wanted:
+            per_worker_mb = -(-(baseline_cost + largest_target_cost) // (1024 * 1024))
+            budget_note = (
+                f"running {jobs} worker{'s' if jobs > 1 else ''} instead of {wanted}: --cache-mb {cache_mb} "
+                f"is too small for {wanted} (each needs about {per_worker_mb} MB)"
+            )
+
+    if jobs == 1:
+        # not worth (or no room for) starting processes; use this process as the only worker
+        init_worker(baseline_dict)
+        try:
+            results = [compare_target(target, detail) for target in targets]
+        finally:
+            # don't keep the baseline pinned here after the run (the cache decides that)
+            init_worker(None)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(baseline_dict,)) as executor:
+            results = list(executor.map(compare_target, targets, [detail] * len(targets)))
+    return baseline_dict, results, budget_note
+
+
+# compare one baseline snapshot against many targets and print a summary matrix
+def compare_to_baseline(
+    baseline: str,
+    targets: list,
+    detail: bool = False,
+    jobs: int | None = None,
+    cache_mb: int = DEFAULT_CACHE_MB,
+):
+    baseline_dict, results, budget_note = baseline_results(baseline, targets, detail, jobs, cache_mb)
+
+    if budget_note is not None:
+        print(f"Note: {budget_note}")
+    print(f"Baseline: {baseline} ({len(baseline_dict)} files)")
+    print()
+    print_matrix(results)
+
+    if detail:
+        for target, counts, lines in results:
+            print()
+            print(f"=== {target} ===")
+            if not lines:
+                print("  (no differences)")
+            for line in lines:
+                print(line)
+
+
+# print the per-target summary as an aligned table
+def print_matrix(results: list):
+    headers = ("Target", "Added", "Deleted", "Changed", "Unchanged")
+    rows = [
+        (target, str(counts["added"]), str(counts["deleted"]), str(counts["changed"]), str(counts["unchanged"]))
+        for target, counts, _ in results
+    ]
+
+    # calculate column widths so everything lines up
+    col_widths = [len(h) for h in headers]
+    for row in rows:
+        for i, val in enumerate(row):
+            if len(val) > col_widths[i]:
+                col_widths[i] = len(val)
+
+    header_line = "  ".join(h.ljust(col_widths[i]) for i, h in enumerate(headers))
+    print(header_line)
+    print("-" * len(header_line))
+    for row in rows:
+        print("  ".join(val.ljust(col_widths[i]) for i, val in enumerate(row)))
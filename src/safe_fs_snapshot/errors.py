@@ -0,0 +1,32 @@
+"""
+errors.py - Exceptions raised by the library
+
+Library code raises these instead of printing and exiting, so callers
+(the CLI, or a service embedding the scanner) decide how to report them.
+The CLI prints "Error: <message>" and exits with code 1.
+"""
+
+
+# base class, so callers can catch every snapshot error with one except
+class SnapshotError(Exception):
+    pass
+
+
+# the named snapshot has no JSON file in the storage directory
+class SnapshotNotFoundError(SnapshotError):
+    pass
+
+
+# a snapshot name that can't be used as a file name in the storage directory
+class InvalidSnapshotNameError(SnapshotError):
+    pass
+
+
+# the path given to scan doesn't exist or isn't a directory
+class InvalidDirectoryError(SnapshotError):
+    pass
+
+
+# a scan was stopped through its cancel event before it finished
+class ScanCancelledError(SnapshotError):
+    pass
@@ -0,0 +1,281 @@
+"""
+index.py - Per-snapshot path and size index
+
+Every saved snapshot gets a small index directory next to the snapshot JSON:
+
+    ~/.safe-fs-snapshot/index/<name>/
+        meta.json     snapshot metadata (directory, created_at, files_count)
+        records.jsonl one file entry per line, sorted by relative_path
+        offsets.bin   byte offset of each line in records.jsonl
+        by_size.bin   record numbers sorted by (size, relative_path)
+        sizes.bin     the sizes in by_size order (what we binary search on)
+
+The .bin files are raw arrays of unsigned 64-bit ints. They are memory-mapped,
+so a prefix or size range lookup is a binary search (log n) followed by a
+streamed read of only the matching records - the full snapshot is never loaded.
+
+Record number == position in path order, so sorting record numbers gives
+results back in path order for free.
+"""
+
+from array import array
+import bisect
+import fnmatch
+import heapq
+import itertools
+import json
+import mmap
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from safe_fs_snapshot.storage import get_storage_dir, snapshot_path, verify_snapshot_file, verify_snapshot_name
+
+INDEX_VERSION = 1
+ARRAY_TYPECODE = "Q"  # unsigned 64-bit ints
+GLOB_SPECIAL_CHARS = "*?["
+
+
+# the filters accepted by "show" and "query". None means "don't filter on this"
+@dataclass
+class Query:
+    prefix: str | None = None
+    glob: str | None = None
+    min_size: int | None = None
+    max_size: int | None = None
+    newer_than: float | None = None  # unix timestamp, compared against mtime
+    top: int | None = None
+    by: str = "size"
+    offset: int = 0
+    limit: int | None = None
+
+
+# return the index directory for a snapshot (may not exist yet)
+def get_index_dir(snapshot_name: str) -> Path:
+    verify_snapshot_name(snapshot_name)
+    return get_storage_dir() / "index" / snapshot_name
+
+
+# write all index files for a snapshot. snapshot_data is the same wrapper dict saved as JSON
+def build_index(snapshot_name: str, snapshot_data: dict, source_path: Path) -> Path:
+    index_dir = get_index_dir(snapshot_name)
+    # build into a temporary directory, then swap it in so readers never see half an index.
+    # its name starts with ".", which no snapshot name can, so it can't clash with another index
+    index_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=index_dir.parent, prefix=f".{snapshot_name}."))
+    try:
+        _write_index_files(tmp_dir, snapshot_data, source_path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    tmp_dir.rename(index_dir)
+    return index_dir
+
+
+# write the index files for one snapshot into an (empty) directory
+def _write_index_files(tmp_dir: Path, snapshot_data: dict, source_path: Path):
+    files = sorted(snapshot_data.get("files", []), key=lambda f: f["relative_path"])
+
+    # records.jsonl + offsets.bin (path order)
+    offsets = array(ARRAY_TYPECODE)
+    position = 0
+    with open(tmp_dir / "records.jsonl", "wb") as f:
+        for file_entry in files:
+            line = json.dumps(file_entry, separators=(",", ":")).encode("utf-8") + b"\n"
+            offsets.append(position)
+            f.write(line)
+            position += len(line)
+
+    # by_size.bin + sizes.bin (size order, ties broken by path order)
+    by_size = array(ARRAY_TYPECODE, sorted(range(len(files)), key=lambda i: files[i]["size"]))
+    sizes = array(ARRAY_TYPECODE, (files[i]["size"] for i in by_size))
+
+    with open(tmp_dir / "offsets.bin", "wb") as f:
+        offsets.tofile(f)
+    with open(tmp_dir / "by_size.bin", "wb") as f:
+        by_size.tofile(f)
+    with open(tmp_dir / "sizes.bin", "wb") as f:
+        sizes.tofile(f)
+
+    # meta.json is written last; it also records which snapshot file the index was built from
+    meta = {
+        "version": INDEX_VERSION,
+        "source_mtime_ns": source_path.stat().st_mtime_ns,
+        "scanned_directory": snapshot_data.get("scanned_directory", "?"),
+        "created_at": snapshot_data.get("created_at", "unknown"),
+        "files_count": len(files),
+    }
+    with open(tmp_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+# an index is usable if it exists, has the current layout, and was built from the current JSON
+def index_is_fresh(index_dir: Path, source_path: Path) -> bool:
+    try:
+        with open(index_dir / "meta.json", "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get("version") == INDEX_VERSION
+        and meta.get("source_mtime_ns") == source_path.stat().st_mtime_ns
+    )
+
+
+# open the index for a snapshot, building it first if it is missing or out of date
+def open_index(snapshot_name: str) -> "SnapshotIndex":
+    snapshot_file_path = snapshot_path(snapshot_name)
+    # check if that snapshot actually exists
+    verify_snapshot_file(snapshot_file_path)
+
+    index_dir = get_index_dir(snapshot_name)
+    if not index_is_fresh(index_dir, snapshot_file_path):
+        # older snapshots (or ones edited by hand) pay one full load to get indexed
+        with open(snapshot_file_path, "r") as f:
+            snapshot_data = json.load(f)
+        build_index(snapshot_name, snapshot_data, snapshot_file_path)
+
+    return SnapshotIndex(index_dir)
+
+
+# memory-mapped, read-only view of one snapshot index. use it as a context manager
+class SnapshotIndex:
+    def __init__(self, index_dir: Path):
+        with open(index_dir / "meta.json", "r") as f:
+            self.meta = json.load(f)
+        self._maps = []
+        self._views = []
+        self.records = self._map(index_dir / "records.jsonl")
+        self.offsets = self._map_array(index_dir / "offsets.bin")
+        self.by_size = self._map_array(index_dir / "by_size.bin")
+        self.sizes = self._map_array(index_dir / "sizes.bin")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    # mmap can't map an empty file, so empty snapshots get an empty bytes object instead
+    def _map(self, path: Path):
+        with open(path, "rb") as f:
+            if path.stat().st_size == 0:
+                return b""
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def _map_array(self, path: Path):
+        view = memoryview(self._map(path)).cast(ARRAY_TYPECODE)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        # memoryviews must be released before the mmaps they point into can close
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._views = []
+        self._maps = []
+
+    # decode the file entry at a given record number (= position in path order)
+    def record(self, record_number: int) -> dict:
+        start = self.offsets[record_number]
+        end = self.records.find(b"\n", start)
+        return json.loads(self.records[start:end])
+
+    def path(self, record_number: int) -> str:
+        return self.record(record_number)["relative_path"]
+
+    # [lo, hi) record numbers whose path starts with prefix
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        if not prefix:
+            return 0, len(self)
+        lo = bisect.bisect_left(range(len(self)), prefix, key=self.path)
+        upper = prefix_upper_bound(prefix)
+        if upper is None:
+            hi = lo
+            while hi < len(self) and self.path(hi).startswith(prefix):
+                hi += 1
+        else:
+            hi = bisect.bisect_left(range(len(self)), upper, lo=lo, key=self.path)
+        return lo, hi
+
+    # [lo, hi) positions in by_size/sizes whose size is within the bounds
+    def size_range(self, min_size: int | None, max_size: int | None) -> tuple[int, int]:
+        lo = 0 if min_size is None else bisect.bisect_left(self.sizes, min_size)
+        hi = len(self) if max_size is None else bisect.bisect_right(self.sizes, max_size)
+        return lo, max(lo, hi)
+
+
+# smallest string that sorts after every string starting with prefix (None if there isn't one)
+def prefix_upper_bound(prefix: str) -> str | None:
+    last = ord(prefix[-1])
+    if last == 0x10FFFF:
+        return None
+    return prefix[:-1] + chr(last + 1)
+
+
+# the part of a glob pattern before its first wildcard, e.g. "logs/**/*.txt" -> "logs/"
+def glob_literal_prefix(pattern: str) -> str:
+    for i, char in enumerate(pattern):
+        if char in GLOB_SPECIAL_CHARS:
+            return pattern[:i]
+    return pattern
+
+
+# check a decoded entry against every filter in the query
+def matches(file_entry: dict, query: Query) -> bool:
+    path = file_entry["relative_path"]
+    if query.prefix is not None and not path.startswith(query.prefix):
+        return False
+    if query.glob is not None and not fnmatch.fnmatchcase(path, query.glob):
+        return False
+    if query.min_size is not None and file_entry["size"] < query.min_size:
+        return False
+    if query.max_size is not None and file_entry["size"] > query.max_size:
+        return False
+    if query.newer_than is not None and file_entry["mtime"] <= query.newer_than:
+        return False
+    return True
+
+
+# yield the matching file entries for a query, one page at a time (offset/limit)
+def run_query(index: SnapshotIndex, query: Query) -> Iterator[dict]:
+    # prefix filters on both --prefix and the glob's literal part; the longer one narrows more
+    prefixes = [p for p in (query.prefix, glob_literal_prefix(query.glob or "")) if p]
+    range_prefix = max(prefixes, key=len) if prefixes else ""
+
+    path_lo, path_hi = index.prefix_range(range_prefix)
+    size_lo, size_hi = index.size_range(query.min_size, query.max_size)
+
+    if query.top is not None and query.by == "size" and not range_prefix:
+        # largest first, straight off the size index
+        candidates = (index.record(index.by_size[i]) for i in range(size_hi - 1, size_lo - 1, -1))
+        results = itertools.islice((e for e in candidates if matches(e, query)), query.top)
+    else:
+        # drive the scan from whichever index gives fewer candidates
+        if path_hi - path_lo <= size_hi - size_lo:
+            record_numbers = range(path_lo, path_hi)
+        else:
+            record_numbers = sorted(
+                n for n in (index.by_size[i] for i in range(size_lo, size_hi)) if path_lo <= n < path_hi
+            )
+        results = (e for e in map(index.record, record_numbers) if matches(e, query))
+        if query.top is not None:
+            # ties go to the later path, the same order the size index gives when read backwards
+            results = iter(
+                heapq.nlargest(query.top, results, key=lambda e: (e[query.by], e["relative_path"]))
+            )
+
+    stop = None if query.limit is None else query.offset + query.limit
+    return itertools.islice(results, query.offset, stop)
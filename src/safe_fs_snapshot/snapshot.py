@@ -1,91 +1,210 @@
 import json
+import os
+import threading
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from datetime import datetime
-from safe_fs_snapshot.storage import get_storage_dir, verify_snapshot_file
+from typing import Callable
+from safe_fs_snapshot.errors import InvalidDirectoryError, ScanCancelledError
+from safe_fs_snapshot.storage import get_storage_dir, snapshot_path, verify_snapshot_file
+from safe_fs_snapshot import index
+from safe_fs_snapshot.traversal import (
+    ScanRoot,
+    TraversalPolicy,
+    VisitedDirectories,
+    hardlink_order,
+    mark_hardlinks,
+    prepare_scan,
+)
+
+
+# what scan_directory found in one directory
+@dataclass
+class DirectoryScan:
+    directory: Path
+    files: list = field(default_factory=list)  # file entry dicts
+    subdirectories: list = field(default_factory=list)  # (Path, (st_dev, st_ino), is_symlink) still to scan
+    hardlink_candidates: list = field(default_factory=list)  # (entry, (st_dev, st_ino), is_symlink) that may have other names
+    warnings: list = field(default_factory=list)  # messages for entries that couldn't be read
+
+
+# progress passed to on_progress after each directory is scanned (a new object every call)
+@dataclass
+class ScanProgress:
+    directories_scanned: int = 0
+    files_found: int = 0
+    current_directory: Path | None = None
 
 
 # given a directory, output the list of snapshot containing dictionaries
-def create_snapshot(directory: Path) -> list:
+# policy controls symlinks, mounts, and pseudo filesystems (see traversal.py).
+# on_progress(ScanProgress) is called after every directory, on_warning(message) for unreadable entries.
+# setting cancel_event (a threading.Event) stops the scan with ScanCancelledError
+def create_snapshot(
+    directory: Path,
+    policy: TraversalPolicy | None = None,
+    on_progress: Callable[[ScanProgress], None] | None = None,
+    on_warning: Callable[[str], None] | None = None,
+    cancel_event: threading.Event | None = None,
+) -> list:
     # check if this directory is actually on computer
     verify_directory(directory)
 
     # --- Normalize to absolute path ---
     # .resolve() converts relative -> absolute and cleans up ".." and "."
     root_dir = directory.resolve()
+    root = prepare_scan(root_dir, policy or TraversalPolicy())
+    visited = VisitedDirectories(root)
 
     # --- Iterative directory traversal (depth-first using a stack) ---
     # Stack = list used as a to-do list of directories to scan.
     # pop() from end = depth-first. See python_study.py Concept 6 for details.
     stack = [root_dir]
 
+    progress = ScanProgress()
     files_snapshot = []
-    while stack:
+    hardlink_candidates = []
+    while stack or visited.has_linked:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ScanCancelledError(f"scan of {root_dir} was cancelled")
+
+        if not stack:
+            # everything reachable without symlinks is done; now the next symlinked directory
+            linked_dir, skipped = visited.pop_linked()
+            if on_warning is not None:
+                for message in skipped:
+                    on_warning(message)
+            if linked_dir is None:
+                break
+            stack.append(linked_dir)
+
         current_dir = stack.pop()
+        result = scan_directory(current_dir, root)
+        stack.extend(visited.filter_new(result))  # add to stack so they get scanned later
+        files_snapshot.extend(result.files)
+        hardlink_candidates.extend(result.hardlink_candidates)
+
+        if on_warning is not None:
+            for message in result.warnings:
+                on_warning(message)
+        if on_progress is not None:
+            progress.directories_scanned += 1
+            progress.files_found += len(result.files)
+            progress.current_directory = current_dir
+            # a copy each time, so callers can keep or pass on what they receive
+            on_progress(replace(progress))
+
+    # sort the file snapshot alphabetically by relative_path
+    files_snapshot.sort(key=lambda f: f["relative_path"])
+
+    # the first name of each inode (see traversal.hardlink_order) keeps the full entry
+    hardlink_candidates.sort(key=hardlink_order)
+    mark_hardlinks(hardlink_candidates, {})
+
+    return files_snapshot
+
+
+# list one directory: collect its files and the subdirectories still to scan.
+# never raises for unreadable entries - they become warnings so one bad path can't stop a scan
+def scan_directory(current_dir: Path, root: ScanRoot) -> DirectoryScan:
+    result = DirectoryScan(current_dir)
+    follow = root.policy.follow_symlinks
 
-        # List directory contents. Can fail due to permissions or race conditions.
-        # try/except prevents one bad directory from crashing the whole scan.
-        # "continue" skips to the next directory in the stack.
+    # List directory contents. Can fail due to permissions or race conditions.
+    # os.scandir is used instead of Path.iterdir: its entries already know whether they
+    # are files or directories, which saves a stat call per entry.
+    try:
+        with os.scandir(current_dir) as it:
+            entries = list(it)
+    except PermissionError:
+        result.warnings.append(f"permission denied  reading: {current_dir}")
+        return result
+    except FileNotFoundError:
+        result.warnings.append(f"directory disappeared: {current_dir}")
+        return result
+    except OSError as e:
+        result.warnings.append(f"failed to read: {current_dir} ({e})")
+        return result
+
+    # every entry in this directory shares the same relative prefix
+    relative_dir = current_dir.relative_to(root.path).as_posix()
+    prefix = "" if relative_dir == "." else f"{relative_dir}/"
+
+    # Classify each entry and schedule subdirectories for later scanning
+    for entry in entries:
         try:
-            entries = list(current_dir.iterdir())
+            is_symlink = entry.is_symlink()
+            if entry.is_dir(follow_symlinks=follow):
+                dir_stats = entry.stat(follow_symlinks=follow)
+                if root.policy.one_file_system and dir_stats.st_dev != root.device:
+                    continue
+                if dir_stats.st_dev in root.skip_devices:
+                    continue
+                result.subdirectories.append((Path(entry.path), (dir_stats.st_dev, dir_stats.st_ino), is_symlink))
+                continue
+
+            if entry.is_file(follow_symlinks=follow):
+                entry_stats = entry.stat(follow_symlinks=follow)
+                file_entry = {
+                    "relative_path": prefix + entry.name,
+                    "size": entry_stats.st_size,
+                    "mtime": entry_stats.st_mtime,
+                }
+                # when following, any file can also be reached through a symlink (even with
+                # st_nlink == 1), so every file is a candidate; otherwise only real hardlinks are
+                if follow or entry_stats.st_nlink > 1:
+                    key = (entry_stats.st_dev, entry_stats.st_ino)
+                    result.hardlink_candidates.append((file_entry, key, is_symlink))
+            elif is_symlink:
+                # not followed, or followed but dangling: record the link itself
+                entry_stats = entry.stat(follow_symlinks=False)
+                file_entry = {
+                    "relative_path": prefix + entry.name,
+                    "type": "symlink",
+                    "target": os.readlink(entry.path),
+                    "size": entry_stats.st_size,
+                    "mtime": entry_stats.st_mtime,
+                }
+            else:
+                continue  # sockets, fifos, device nodes
         except PermissionError:
-            print(f"WARNING: permission denied  reading: {current_dir}")
+            result.warnings.append(f"permission denied  reading: {entry.path}")
             continue
         except FileNotFoundError:
-            print(f"WARNING: directory disappeared: {current_dir}")
+            result.warnings.append(f"file disappeared: {entry.path}")
             continue
         except OSError as e:
-            print(f"WARNING: failed to read: {current_dir} ({e})")
+            result.warnings.append(f"failed to read: {entry.path} ({e})")
             continue
 
-        # Classify each entry and schedule subdirectories for later scanning
-        for entry in entries:
-            if entry.is_dir():
-                stack.append(entry)  # add to stack so it gets scanned later
-            elif entry.is_file():
-                try:
-                    relative_path = entry.relative_to(root_dir)
-                    entry_stats = entry.stat()
-                    entry_size = entry_stats.st_size
-                    entry_mtime = entry_stats.st_mtime
-                except PermissionError:
-                    print(f"WARNING: permission denied  reading: {entry}")
-                    continue
-                except FileNotFoundError:
-                    print(f"WARNING: file disappeared: {entry}")
-                    continue
-                except OSError as e:
-                    print(f"WARNING: failed to read: {entry} ({e})")
-                    continue
-
-                files_snapshot.append(
-                    {
-                        "relative_path": relative_path.as_posix(),
-                        "size": entry_size,
-                        "mtime": entry_mtime,
-                    }
-                )
+        result.files.append(file_entry)
 
-    # sort the file snapshot alphabetically by relative_path
-    files_snapshot.sort(key=lambda f: f["relative_path"])
-
-    return files_snapshot
+    return result
 
 
 # verify that the directory given exists in the os and is actually a directory, not a file
 def verify_directory(directory: Path):
     if not directory.exists():
-        print(f"Error: path does not exist: {directory}")
-        raise SystemExit(1)
+        raise InvalidDirectoryError(f"path does not exist: {directory}")
 
     if not directory.is_dir():
-        print(f"Error: path is not a directory: {directory}")
-        raise SystemExit(1)
+        raise InvalidDirectoryError(f"path is not a directory: {directory}")
+
+
+# read a saved snapshot (the whole wrapper dict: scanned_directory, created_at, files_count, files)
+def load_snapshot(snapshot_name: str) -> dict:
+    snapshot_file_path = snapshot_path(snapshot_name)
+    # check if that snapshot actually exists
+    verify_snapshot_file(snapshot_file_path)
+    with open(snapshot_file_path, "r") as f:
+        return json.load(f)
 
 
 # write the snapshot to the file
 def write_snapshot(snapshot: list, scanned_directory: Path, snapshot_name: str):
+    # check the name before anything is written, so a bad name can't leave a JSON file without an index
+    snapshot_file_path = snapshot_path(snapshot_name)
     scanned_directory = scanned_directory.resolve()
-    snapshot_storage_path = get_storage_dir()
     created_at = datetime.now().isoformat()
     file_count = len(snapshot)
     wrapper = {
@@ -95,9 +214,12 @@ def write_snapshot(snapshot: list, scanned_directory: Path, snapshot_name: str):
         "files": snapshot,
     }
 
-    with open(snapshot_storage_path / f"{snapshot_name}.json", "w") as f:
+    with open(snapshot_file_path, "w") as f:
         json.dump(wrapper, f, indent=2)
 
+    # build the path/size index now, while the files list is already in memory
+    index.build_index(snapshot_name, wrapper, snapshot_file_path)
+
 
 # print a formatted table of all saved snapshots
 def list_snapshots():
@@ -145,45 +267,77 @@ def list_snapshots():
         print("  ".join(val.ljust(col_widths[i]) for i, val in enumerate(row)))
 
 
-# show formatted details of a single snapshot
-def show_snapshot(snapshot_name: str):
-    snapshot_file_path = get_storage_dir() / f"{snapshot_name}.json"
-    # check if that snapshot actually exists
-    verify_snapshot_file(snapshot_file_path)
-    # open the correct snapshot json, then print out its data
-    with open(snapshot_file_path, "r") as f:
-        snapshot_data = json.load(f)
+# show formatted details of a single snapshot, optionally filtered by a query
+def show_snapshot(snapshot_name: str, query: index.Query | None = None):
+    if query is None:
+        query = index.Query()
+
+    # the index holds the metadata too, so the snapshot JSON is never loaded here
+    with index.open_index(snapshot_name) as snapshot_index:
+        meta = snapshot_index.meta
+
+        # print snapshot metadata
+        print(f"Snapshot:   {snapshot_name}")
+        print(f"Directory:  {meta.get('scanned_directory', '?')}")
+        print(f"Created:    {format_created(meta.get('created_at', 'unknown'))}")
+        print(f"Files:      {meta.get('files_count', '?')}")
+        print()
+
+        if len(snapshot_index) == 0:
+            print("  (no files)")
+            return
+
+        page = list(index.run_query(snapshot_index, query))
+
+    if not page:
+        print("  (no matching files)")
+        return
+    print_file_rows(page)
+
+
+# print only the files matching a query (no metadata header)
+def query_snapshot(snapshot_name: str, query: index.Query):
+    with index.open_index(snapshot_name) as snapshot_index:
+        page = list(index.run_query(snapshot_index, query))
+
+    if not page:
+        print("No matching files.")
+        return
+    print_file_rows(page, show_mtime=True)
+
+
+# print file entries as aligned rows. column widths come from this page only
+def print_file_rows(files: list, show_mtime: bool = False):
+    max_path_len = max(len(f["relative_path"]) for f in files)
+    size_strs = [format_size(f["size"]) for f in files]
+    max_size_len = max(len(s) for s in size_strs)
+    for file_entry, size_str in zip(files, size_strs):
+        # the size column only needs padding when the mtime column follows it
+        size_column = size_str.ljust(max_size_len) if show_mtime else size_str
+        line = f"  {file_entry['relative_path'].ljust(max_path_len)}  {size_column}"
+        if show_mtime:
+            line += "  " + datetime.fromtimestamp(file_entry["mtime"]).strftime("%Y-%m-%d %I:%M %p")
+        print(line)
+
+
+# format a size in bytes in a human-readable way
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    elif size < 1024 * 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size / (1024 * 1024 * 1024):.1f} GB"
+
 
-    # print snapshot metadata
-    print(f"Snapshot:   {snapshot_name}")
-    print(f"Directory:  {snapshot_data.get('scanned_directory', '?')}")
-    created = snapshot_data.get("created_at", "unknown")
+# format the ISO created_at timestamp into a readable date/time
+def format_created(created: str) -> str:
     if created != "unknown":
         try:
             dt = datetime.fromisoformat(created)
             created = dt.strftime("%Y-%m-%d %I:%M %p")
         except ValueError:
             pass
-    print(f"Created:    {created}")
-    print(f"Files:      {snapshot_data.get('files_count', '?')}")
-    print()
-
-    # print each file with its size
-    files = snapshot_data.get("files", [])
-    if not files:
-        print("  (no files)")
-        return
-
-    # calculate column width for aligned output
-    max_path_len = max(len(f["relative_path"]) for f in files)
-    for file_entry in files:
-        path = file_entry["relative_path"]
-        size = file_entry["size"]
-        # format size in a human-readable way
-        if size < 1024:
-            size_str = f"{size} B"
-        elif size < 1024 * 1024:
-            size_str = f"{size / 1024:.1f} KB"
-        else:
-            size_str = f"{size / (1024 * 1024):.1f} MB"
-        print(f"  {path.ljust(max_path_len)}  {size_str}")
+    return created
@@ -6,6 +6,7 @@ the snapshot storage directory and validating snapshot files.
 """
 
 from pathlib import Path
+from safe_fs_snapshot.errors import InvalidSnapshotNameError, SnapshotNotFoundError
 
 
 # create a storage directory. if already exists, then dont create new one. return path to it
@@ -16,8 +17,23 @@ def get_storage_dir() -> Path:
     return snapshot_dir
 
 
+# the JSON file of a named snapshot (may not exist yet). every snapshot name read from
+# the user goes through here, so a name can never point outside the storage directory
+def snapshot_path(snapshot_name: str) -> Path:
+    verify_snapshot_name(snapshot_name)
+    return get_storage_dir() / f"{snapshot_name}.json"
+
+
 # verify that the snapshot file actually exists
 def verify_snapshot_file(snapshot_path: Path):
     if not snapshot_path.exists():
-        print(f"Error: snapshot '{snapshot_path.stem}' not found.")
-        raise SystemExit(1)
+        raise SnapshotNotFoundError(f"snapshot '{snapshot_path.stem}' not found.")
+
+
+# a snapshot name becomes <name>.json and index/<name>/, so it can't contain path separators.
+# names starting with "." (which includes "." and "..") are reserved for temporary index directories
+def verify_snapshot_name(snapshot_name: str):
+    if not snapshot_name or snapshot_name.startswith(".") or "/" in snapshot_name or "\\" in snapshot_name:
+        raise InvalidSnapshotNameError(
+            f"invalid snapshot name: {snapshot_name!r} (names can't contain / or \\ or start with .)"
+        )
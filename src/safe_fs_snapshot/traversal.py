@@ -0,0 +1,163 @@
+"""
+traversal.py - Traversal policies for scanning
+
+Controls how a scan treats symlinks, mount points, and hardlinks:
+
+    one_file_system          don't descend into directories on another device (like du -x)
+    follow_symlinks          descend into / stat through symlinks instead of recording them
+    skip_pseudo_filesystems  never descend into proc, sysfs, cgroup, ... mounts
+
+Loops can only happen when symlinks are followed (or a directory is bind-mounted
+inside itself), so every directory's (st_dev, st_ino) is remembered and a directory
+is never scanned twice. Symlinked directories wait until every directory reachable
+without symlinks has been scanned, and then go in path order, so a directory is
+always recorded under its real path when it has one, whatever order the OS lists
+entries in. Files with several names (hardlinks, or symlinks when following) are
+recorded in full once; the other names become "hardlink" entries that point at the
+first name (names that aren't symlinks first, then alphabetical).
+
+Entry types in a snapshot ("type" is left out for regular files, so older
+snapshots still compare equal):
+    {"relative_path", "size", "mtime"}                                 regular file
+    {"relative_path", "type": "symlink", "target", "size", "mtime"}    symlink (not followed)
+    {"relative_path", "type": "hardlink", "link_to", "size", "mtime"}  another name for link_to
+"""
+
+import heapq
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+MOUNTINFO_PATH = Path("/proc/self/mountinfo")
+
+# kernel/virtual filesystems that hold no user data and can be huge or endless to walk
+PSEUDO_FILESYSTEMS = {
+    "autofs",
+    "binfmt_misc",
+    "bpf",
+    "cgroup",
+    "cgroup2",
+    "configfs",
+    "debugfs",
+    "devpts",
+    "devtmpfs",
+    "efivarfs",
+    "fusectl",
+    "hugetlbfs",
+    "mqueue",
+    "nsfs",
+    "proc",
+    "pstore",
+    "rpc_pipefs",
+    "securityfs",
+    "sysfs",
+    "tracefs",
+}
+
+
+# how a scan should walk the tree (see the module docstring)
+@dataclass(frozen=True)
+class TraversalPolicy:
+    one_file_system: bool = False
+    follow_symlinks: bool = False
+    skip_pseudo_filesystems: bool = True
+
+
+# everything scan_directory needs that stays the same for the whole scan
+@dataclass(frozen=True)
+class ScanRoot:
+    path: Path
+    device: int  # st_dev of the root, for one_file_system
+    inode: int
+    policy: TraversalPolicy
+    skip_devices: frozenset  # st_dev values of pseudo filesystem mounts
+
+
+# stat the (already resolved) root and collect what the policy needs up front
+def prepare_scan(root_dir: Path, policy: TraversalPolicy) -> ScanRoot:
+    root_stats = root_dir.stat()
+    skip_devices = read_pseudo_devices() if policy.skip_pseudo_filesystems else frozenset()
+    return ScanRoot(root_dir, root_stats.st_dev, root_stats.st_ino, policy, skip_devices)
+
+
+# device ids of every pseudo filesystem mount, from /proc/self/mountinfo. empty where that file doesn't exist
+def read_pseudo_devices() -> frozenset:
+    try:
+        with open(MOUNTINFO_PATH, "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return frozenset()
+
+    devices = set()
+    for line in lines:
+        # "<id> <parent> <major>:<minor> <root> <mount point> <options> [optional...] - <fstype> <source> <super options>"
+        fields, separator, rest = line.partition(" - ")
+        if not separator:
+            continue
+        fields = fields.split()
+        fstype = rest.split(" ", 1)[0]
+        if len(fields) < 3 or fstype not in PSEUDO_FILESYSTEMS:
+            continue
+        major, _, minor = fields[2].partition(":")
+        try:
+            devices.add(os.makedev(int(major), int(minor)))
+        except ValueError:
+            continue
+    return frozenset(devices)
+
+
+# state kept by whoever schedules directories: which directories were already seen,
+# and the symlinked directories still waiting for their turn (see the module docstring)
+class VisitedDirectories:
+    def __init__(self, root: ScanRoot):
+        self._seen = {(root.device, root.inode)}
+        self._linked = []  # heap of (path string, Path, (st_dev, st_ino))
+
+    # keep only real subdirectories not seen before (repeats get a warning added to the result).
+    # symlinked ones are held back for pop_linked
+    def filter_new(self, result) -> list:
+        new_dirs = []
+        for path, key, is_symlink in result.subdirectories:
+            if is_symlink:
+                heapq.heappush(self._linked, (str(path), path, key))
+                continue
+            if key in self._seen:
+                result.warnings.append(f"already visited (symlink loop or repeated mount), skipping: {path}")
+                continue
+            self._seen.add(key)
+            new_dirs.append(path)
+        return new_dirs
+
+    @property
+    def has_linked(self) -> bool:
+        return bool(self._linked)
+
+    # call once no real directories are left to scan: the first waiting symlinked directory
+    # (by path) that leads somewhere new, or None, plus warnings for the ones skipped on the way
+    def pop_linked(self) -> tuple[Path | None, list]:
+        warnings = []
+        while self._linked:
+            _, path, key = heapq.heappop(self._linked)
+            if key in self._seen:
+                warnings.append(f"already visited (symlink loop or repeated mount), skipping: {path}")
+                continue
+            self._seen.add(key)
+            return path, warnings
+        return None, warnings
+
+
+# turn every repeat of an inode into a "hardlink" entry pointing at the first name seen.
+# candidates is (entry, (st_dev, st_ino), is_symlink) tuples; seen maps inode -> first relative_path
+# and can be shared across calls when entries arrive in batches
+def mark_hardlinks(candidates: list, seen: dict):
+    for file_entry, key, _ in candidates:
+        first_path = seen.setdefault(key, file_entry["relative_path"])
+        if first_path != file_entry["relative_path"]:
+            file_entry["type"] = "hardlink"
+            file_entry["link_to"] = first_path
+
+
+# order in which names of the same inode are considered: real names first, then alphabetical
+def hardlink_order(candidate: tuple) -> tuple:
+    file_entry, _, is_symlink = candidate
+    return is_symlink, file_entry["relative_path"]
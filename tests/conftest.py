@@ -0,0 +1,15 @@
+import pytest
+
+
+# a file entry as it appears in a snapshot's files list
+def entry(path, size=0, mtime=0.0):
+    return {"relative_path": path, "size": size, "mtime": mtime}
+
+
+# every test gets its own empty storage directory (get_storage_dir uses ~/.safe-fs-snapshot).
+# it lives outside tmp_path, so tests can scan tmp_path without seeing it
+@pytest.fixture(autouse=True)
+def storage_home(tmp_path_factory, monkeypatch):
+    home = tmp_path_factory.mktemp("home")
+    monkeypatch.setenv("HOME", str(home))
+    return home / ".safe-fs-snapshot"
@@ -0,0 +1,216 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+from conftest import entry
+
+from safe_fs_snapshot import api, cli, diff, snapshot
+from safe_fs_snapshot.errors import InvalidDirectoryError, ScanCancelledError, SnapshotNotFoundError
+
+
+# a small tree: 3 levels of directories with a few files in each
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    for directory in ("", "a", "a/b", "a/b/c", "d", "d/e"):
+        (root / directory).mkdir(parents=True, exist_ok=True)
+        for i in range(3):
+            (root / directory / f"f{i}.txt").write_text("x" * i)
+    return root
+
+
+def test_missing_directory_raises(tmp_path):
+    with pytest.raises(InvalidDirectoryError):
+        snapshot.create_snapshot(tmp_path / "nope")
+    with pytest.raises(InvalidDirectoryError):
+        asyncio.run(api.create_snapshot_async(tmp_path / "nope"))
+    (tmp_path / "file").write_text("")
+    with pytest.raises(InvalidDirectoryError):
+        snapshot.create_snapshot(tmp_path / "file")
+
+
+def test_missing_snapshot_raises():
+    with pytest.raises(SnapshotNotFoundError):
+        snapshot.load_snapshot("nope")
+    with pytest.raises(SnapshotNotFoundError):
+        asyncio.run(api.load_snapshot_async("nope"))
+
+    async def consume():
+        return [change async for change in api.diff_async("nope", "nope2")]
+
+    with pytest.raises(SnapshotNotFoundError):
+        asyncio.run(consume())
+
+
+@pytest.mark.parametrize("argv", [["show", "nope"], ["diff", "nope", "nope2"], ["scan", "/does/not/exist"]])
+def test_cli_reports_errors_with_exit_code_1(monkeypatch, capsys, argv):
+    monkeypatch.setattr(sys, "argv", ["safe-fs-snapshot", *argv])
+    assert cli.main() == 1
+    assert capsys.readouterr().out.startswith("Error: ")
+
+
+def test_create_snapshot_async_matches_sync(tree):
+    expected = snapshot.create_snapshot(tree)
+    assert len(expected) == 18
+    assert asyncio.run(api.create_snapshot_async(tree, max_workers=2)) == expected
+
+
+def test_scan_async_yields_every_entry(tree, monkeypatch):
+    monkeypatch.setattr(api, "YIELD_EVERY", 2)
+
+    async def collect():
+        return [file_entry async for file_entry in api.scan_async(tree, max_workers=3)]
+
+    found = asyncio.run(collect())
+    assert sorted(found, key=lambda f: f["relative_path"]) == snapshot.create_snapshot(tree)
+
+
+def test_cancelling_the_task_shuts_down_the_executor(tree, monkeypatch):
+    executors = []
+
+    class RecordingExecutor(api.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.shutdown_calls = []
+            executors.append(self)
+
+        def shutdown(self, wait=True, *, cancel_futures=False):
+            self.shutdown_calls.append((wait, cancel_futures))
+            super().shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    monkeypatch.setattr(api, "ThreadPoolExecutor", RecordingExecutor)
+
+    async def run():
+        first_directory = asyncio.Event()
+        task = asyncio.create_task(
+            api.create_snapshot_async(tree, max_workers=1, on_progress=lambda p: first_directory.set())
+        )
+        await first_directory.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert len(executors) == 1
+    assert executors[0].shutdown_calls == [(False, True)]
+
+
+def test_cancel_event_stops_sync_scan(tree):
+    cancel_event = threading.Event()
+    seen = []
+
+    def on_progress(progress):
+        seen.append(progress.directories_scanned)
+        cancel_event.set()
+
+    with pytest.raises(ScanCancelledError):
+        snapshot.create_snapshot(tree, on_progress=on_progress, cancel_event=cancel_event)
+    assert seen == [1]
+
+
+def test_progress_and_warning_callbacks(tree, monkeypatch):
+    real_scandir = snapshot.os.scandir
+    locked = tree / "d"
+
+    def scandir(path):
+        if str(path) == str(locked):
+            raise PermissionError(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(snapshot.os, "scandir", scandir)
+
+    for scan in (
+        snapshot.create_snapshot,
+        lambda root, **callbacks: asyncio.run(api.create_snapshot_async(root, **callbacks)),
+    ):
+        progress_seen = []
+        warnings = []
+        files = scan(
+            tree,
+            on_progress=lambda p: progress_seen.append((p.directories_scanned, p.files_found)),
+            on_warning=warnings.append,
+        )
+        # "d" can't be listed, so neither it nor "d/e" is scanned
+        assert len(files) == 12
+        assert warnings == [f"permission denied  reading: {locked}"]
+        assert [count for count, _ in progress_seen] == [1, 2, 3, 4, 5]
+        assert progress_seen[-1][1] == 12
+
+
+def test_on_progress_gets_a_new_object_each_time(tree):
+    for scan in (
+        snapshot.create_snapshot,
+        lambda root, **callbacks: asyncio.run(api.create_snapshot_async(root, **callbacks)),
+    ):
+        received = []
+        scan(tree, on_progress=received.append)
+        # values kept from earlier calls don't change afterwards
+        assert [p.directories_scanned for p in received] == list(range(1, 7))
+        assert len({id(p) for p in received}) == 6
+        assert received[-1].files_found == 18
+
+
+def test_iter_changes_kinds():
+    old = diff.to_dictionary([entry("same", 1), entry("gone", 2), entry("grew", 3)])
+    new = diff.to_dictionary([entry("same", 1), entry("grew", 4), entry("new", 5)])
+
+    changes = list(diff.iter_changes(old, new))
+
+    assert [(c.kind, c.path) for c in changes] == [
+        ("unchanged", "same"),
+        ("deleted", "gone"),
+        ("changed", "grew"),
+        ("added", "new"),
+    ]
+    assert changes[2].old["size"] == 3 and changes[2].new["size"] == 4
+    assert changes[1].new is None and changes[3].old is None
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 10])
+def test_load_snapshot_async_matches_sync(tmp_path, monkeypatch, count):
+    # small chunks so several chunk boundaries are crossed
+    monkeypatch.setattr(api, "DECODE_CHUNK", 3)
+    files = [entry(f"f{i:02d}\nodd name" if i == 4 else f"f{i:02d}", i, i / 3) for i in range(count)]
+    snapshot.write_snapshot(files, tmp_path, "snap")
+
+    loaded = asyncio.run(api.load_snapshot_async("snap"))
+
+    assert loaded == snapshot.load_snapshot("snap")
+    assert loaded["files"] == files
+
+
+def test_diff_async_matches_iter_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "YIELD_EVERY", 2)
+    monkeypatch.setattr(api, "DECODE_CHUNK", 2)
+    old = [entry(f"f{i}", i) for i in range(9)]
+    new = [entry(f"f{i}", i + (i % 3 == 0)) for i in range(2, 12)]
+    snapshot.write_snapshot(old, tmp_path, "old")
+    snapshot.write_snapshot(new, tmp_path, "new")
+
+    async def collect():
+        return [change async for change in api.diff_async("old", "new")]
+
+    # snapshots come back in path order ("f10" before "f9")
+    def by_path(files):
+        return diff.to_dictionary(sorted(files, key=lambda f: f["relative_path"]))
+
+    expected = list(diff.iter_changes(by_path(old), by_path(new)))
+    assert asyncio.run(collect()) == expected
+
+
+def test_cli_diff_output(tmp_path, monkeypatch, capsys):
+    snapshot.write_snapshot([entry("a", 1), entry("b", 2)], tmp_path, "old")
+    snapshot.write_snapshot([entry("b", 3), entry("c", 4)], tmp_path, "new")
+    monkeypatch.setattr(sys, "argv", ["safe-fs-snapshot", "diff", "old", "new"])
+
+    assert cli.main() == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "Comparing: old vs new",
+        "",
+        "- a",
+        "+ c",
+        "~ b (size: 2 -> 3)",
+        "",
+        "Summary: 1 added, 1 deleted, 1 changed, 0 unchanged",
+    ]
@@ -0,0 +1,57 @@
+import argparse
+import sys
+
+import pytest
+
+from safe_fs_snapshot import cli
+
+
+def run_cli(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["safe-fs-snapshot", *argv])
+    return cli.main()
+
+
+def test_auto_named_scan_of_absolute_path(tmp_path, monkeypatch, storage_home, capsys):
+    target = tmp_path / "data"
+    target.mkdir()
+    (target / "f.txt").write_text("hi")
+
+    assert run_cli(monkeypatch, "scan", str(target)) == 0
+
+    saved = list(storage_home.glob("*.json"))
+    assert len(saved) == 1
+    name = saved[0].stem
+    assert name.startswith(target.as_posix().strip("/").replace("/", "_") + "_")
+    assert (storage_home / "index" / name / "meta.json").exists()
+    assert run_cli(monkeypatch, "show", name) == 0
+    assert "f.txt" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("flag", ["--offset", "--limit", "--top"])
+def test_negative_counts_are_usage_errors(tmp_path, monkeypatch, flag):
+    with pytest.raises(SystemExit) as exit_info:
+        run_cli(monkeypatch, "show", "t1", flag, "-1")
+    assert exit_info.value.code == 2
+
+
+@pytest.mark.parametrize("text", ["inf", "1e400", "-inf", "nan", "abc", "1X"])
+def test_parse_size_rejects_bad_input(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.parse_size(text)
+
+
+def test_parse_size_units():
+    assert cli.parse_size("512") == 512
+    assert cli.parse_size("1K") == 1024
+    assert cli.parse_size("1.5kb") == 1536
+    assert cli.parse_size("2GiB") == 2 * 1024**3
+
+
+@pytest.mark.parametrize("text", ["1e400d", "infd", "99999999999w", "yesterday"])
+def test_parse_age_rejects_bad_input(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.parse_age(text)
+
+
+def test_parse_age_accepts_ages_and_dates():
+    assert cli.parse_age("2026-02-07") < cli.parse_age("1h")
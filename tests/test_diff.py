@@ -0,0 +1,134 @@
+import pytest
+from conftest import entry
+
+from safe_fs_snapshot import diff
+from safe_fs_snapshot.snapshot import write_snapshot
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = diff.SnapshotCache()
+    monkeypatch.setattr(diff, "snapshot_cache", cache)
+    return cache
+
+
+def test_find_changes():
+    old = diff.to_dictionary([entry("same", 1), entry("gone", 2), entry("grew", 3)])
+    new = diff.to_dictionary([entry("same", 1), entry("grew", 4), entry("b_new", 5), entry("a_new", 6)])
+
+    changes = diff.find_changes(old, new)
+
+    assert changes == {
+        "added": ["a_new", "b_new"],
+        "deleted": ["gone"],
+        "changed": ["grew"],
+        "unchanged": ["same"],
+    }
+
+
+def test_find_changes_sees_type_changes():
+    old = diff.to_dictionary([entry("a", 1)])
+    new = diff.to_dictionary([{**entry("a", 1), "type": "symlink", "target": "b"}])
+    assert diff.find_changes(old, new)["changed"] == ["a"]
+
+
+def test_count_changes_matches_find_changes():
+    old = diff.to_dictionary([entry(f"f{i}", i) for i in range(10)])
+    new = diff.to_dictionary([entry(f"f{i}", i + (i % 3 == 0)) for i in range(4, 15)])
+
+    changes = diff.find_changes(old, new)
+
+    assert diff.count_changes(old, new) == {kind: len(paths) for kind, paths in changes.items()}
+    assert diff.count_changes({}, {}) == {"added": 0, "deleted": 0, "changed": 0, "unchanged": 0}
+
+
+def make_targets(tmp_path):
+    base = [entry(f"f{i}", i) for i in range(20)]
+    write_snapshot(base, tmp_path, "base")
+    targets = []
+    for t in range(5):
+        files = [entry(f["relative_path"], f["size"] + (1 if i % (t + 2) == 0 else 0)) for i, f in enumerate(base)]
+        files = files[t:] + [entry(f"extra{t}_{k}") for k in range(t)]
+        write_snapshot(files, tmp_path, f"t{t}")
+        targets.append(f"t{t}")
+    return targets
+
+
+def test_baseline_results_same_in_process_and_in_pool(tmp_path, fresh_cache):
+    targets = make_targets(tmp_path)
+
+    _, in_process, _ = diff.baseline_results("base", targets, detail=True, jobs=1)
+    baseline_dict, pooled, budget_note = diff.baseline_results("base", targets, detail=True, jobs=3)
+
+    assert in_process == pooled
+    assert budget_note is None
+    assert [target for target, _, _ in pooled] == targets
+    assert len(baseline_dict) == 20
+    # t0 only changes sizes: every 2nd file grew
+    assert pooled[0][1] == {"added": 0, "deleted": 0, "changed": 10, "unchanged": 10}
+
+
+def test_workers_do_not_cache_targets(tmp_path, fresh_cache):
+    targets = make_targets(tmp_path)
+    diff.baseline_results("base", targets, jobs=1)
+    # only the baseline is held on to, and only by the cache
+    assert list(fresh_cache._entries) == ["base"]
+    assert diff._worker_baseline is None
+    assert fresh_cache.used_bytes == diff.decoded_cost("base")
+
+
+def test_workers_within_budget(fresh_cache):
+    fresh_cache.max_bytes = 1000
+    fresh_cache.used_bytes = 100
+    # 900 left, 300 per worker (baseline copy + target)
+    assert diff.workers_within_budget(8, 200, 100) == 3
+    assert diff.workers_within_budget(2, 200, 100) == 2
+    # room for one worker only: run in this process
+    assert diff.workers_within_budget(8, 400, 100) == 1
+    assert diff.workers_within_budget(8, 2000, 0) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path, fresh_cache, storage_home):
+    for name in ("a", "b", "c"):
+        write_snapshot([entry(f"{name}{i}", i) for i in range(10)], tmp_path, name)
+    cost = diff.decoded_cost("a")
+    assert cost == diff.decoded_cost("b") == diff.decoded_cost("c")
+    assert cost == (storage_home / "a.json").stat().st_size * diff.DECODED_SIZE_FACTOR
+
+    fresh_cache.max_bytes = 2 * cost
+    first_a = fresh_cache.get("a")
+    fresh_cache.get("b")
+    assert fresh_cache.get("a") is first_a  # hit, and "a" is now most recent
+    fresh_cache.get("c")  # over budget: "b" is the least recently used
+
+    assert list(fresh_cache._entries) == ["a", "c"]
+    assert fresh_cache.used_bytes == 2 * cost
+    assert fresh_cache.cost("b") == 0
+
+
+def test_cache_keeps_one_snapshot_over_budget(tmp_path, fresh_cache):
+    write_snapshot([entry("x", 1)], tmp_path, "big")
+    fresh_cache.max_bytes = 1
+    assert "x" in fresh_cache.get("big")
+    assert list(fresh_cache._entries) == ["big"]
+
+
+def test_detail_lines_are_sorted(tmp_path, fresh_cache):
+    write_snapshot([entry("b", 1), entry("a", 1), entry("d", 1), entry("c", 1)], tmp_path, "base")
+    write_snapshot([entry("d", 2), entry("c", 2), entry("z", 1), entry("y", 1)], tmp_path, "t")
+
+    _, [(_, counts, lines)], _ = diff.baseline_results("base", ["t"], detail=True, jobs=1)
+
+    assert counts == {"added": 2, "deleted": 2, "changed": 2, "unchanged": 0}
+    assert lines == ["- a", "- b", "+ y", "+ z", "~ c (size: 1 -> 2)", "~ d (size: 1 -> 2)"]
+
+
+def test_note_when_budget_reduces_workers(tmp_path, fresh_cache, capsys):
+    targets = make_targets(tmp_path)
+
+    # no room for even one extra baseline copy: everything runs in this process
+    diff.compare_to_baseline("base", targets, jobs=4, cache_mb=0)
+
+    out = capsys.readouterr().out
+    assert out.startswith("Note: running 1 worker instead of 4: --cache-mb 0 is too small for 4")
+    assert "Baseline: base (20 files)" in out
@@ -0,0 +1,168 @@
+import pytest
+from conftest import entry
+
+from safe_fs_snapshot import cli, index, snapshot
+from safe_fs_snapshot.errors import InvalidSnapshotNameError
+from safe_fs_snapshot.snapshot import write_snapshot
+
+
+def paths(entries):
+    return [e["relative_path"] for e in entries]
+
+
+# save a snapshot (which builds its index) and open the index
+def make_index(tmp_path, files, name="snap"):
+    write_snapshot(files, tmp_path, name)
+    return index.open_index(name)
+
+
+def test_prefix_range(tmp_path):
+    files = [entry("a/1"), entry("a/2"), entry("ab"), entry("b/1")]
+    with make_index(tmp_path, files) as snapshot_index:
+        assert snapshot_index.prefix_range("a/") == (0, 2)
+        assert snapshot_index.prefix_range("a") == (0, 3)
+        assert snapshot_index.prefix_range("") == (0, 4)
+        assert snapshot_index.prefix_range("z") == (4, 4)
+        assert snapshot_index.prefix_range("0") == (0, 0)
+
+
+def test_prefix_range_without_upper_bound(tmp_path):
+    # a prefix ending in the largest code point has no upper bound string, so the end is found by scanning
+    top = "a\U0010ffff"
+    assert index.prefix_upper_bound(top) is None
+    files = [entry("a"), entry(top), entry(top + "x"), entry("b")]
+    with make_index(tmp_path, files) as snapshot_index:
+        assert snapshot_index.prefix_range(top) == (1, 3)
+
+
+def test_size_range(tmp_path):
+    files = [entry("a", 10), entry("b", 20), entry("c", 20), entry("d", 30)]
+    with make_index(tmp_path, files) as snapshot_index:
+        assert snapshot_index.size_range(None, None) == (0, 4)
+        assert snapshot_index.size_range(20, 20) == (1, 3)
+        assert snapshot_index.size_range(11, 29) == (1, 3)
+        assert snapshot_index.size_range(31, None) == (4, 4)
+        assert snapshot_index.size_range(None, 9) == (0, 0)
+        # min above max: empty, never a negative-length range
+        assert snapshot_index.size_range(25, 15) == (3, 3)
+
+
+def test_glob_literal_prefix():
+    assert index.glob_literal_prefix("logs/**/*.txt") == "logs/"
+    assert index.glob_literal_prefix("*.txt") == ""
+    assert index.glob_literal_prefix("a/[bc]") == "a/"
+    assert index.glob_literal_prefix("exact/path") == "exact/path"
+
+
+def test_glob_narrows_the_path_range(tmp_path, monkeypatch):
+    files = [entry("app/x.txt"), entry("logs/a.txt"), entry("logs/b.log"), entry("logs/c/d.txt")]
+    requested = []
+    original = index.SnapshotIndex.prefix_range
+
+    def recording_prefix_range(self, prefix):
+        requested.append(prefix)
+        return original(self, prefix)
+
+    monkeypatch.setattr(index.SnapshotIndex, "prefix_range", recording_prefix_range)
+    with make_index(tmp_path, files) as snapshot_index:
+        results = list(index.run_query(snapshot_index, index.Query(glob="logs/*.txt")))
+        # the longer of --prefix and the glob's literal part is used for the lookup
+        longer = list(index.run_query(snapshot_index, index.Query(prefix="lo", glob="logs/*.txt")))
+
+    assert requested == ["logs/", "logs/"]
+    # fnmatch's * also matches "/", like the rest of the tool
+    assert paths(results) == paths(longer) == ["logs/a.txt", "logs/c/d.txt"]
+
+
+def test_top_fast_path_matches_heap_path(tmp_path):
+    sizes = [5, 50, 7, 50, 1, 99, 7, 50, 3]
+    files = [entry(f"d/{i}", size) for i, size in enumerate(sizes)]
+    with make_index(tmp_path, files) as snapshot_index:
+        for top in (1, 3, 5, len(files), len(files) + 2):
+            # no prefix: read straight off the size index
+            fast = list(index.run_query(snapshot_index, index.Query(top=top)))
+            # a prefix matching everything goes through the heap instead
+            heap = list(index.run_query(snapshot_index, index.Query(top=top, prefix="d/")))
+            assert fast == heap
+            assert [e["size"] for e in fast] == sorted(sizes, reverse=True)[:top]
+
+
+def test_top_with_size_filter(tmp_path):
+    files = [entry(f"f{i}", size) for i, size in enumerate([1, 2, 3, 4, 5, 6])]
+    with make_index(tmp_path, files) as snapshot_index:
+        results = list(index.run_query(snapshot_index, index.Query(top=2, max_size=4)))
+    assert [e["size"] for e in results] == [4, 3]
+
+
+def test_pagination(tmp_path):
+    files = [entry(f"f{i:02d}", i) for i in range(10)]
+    with make_index(tmp_path, files) as snapshot_index:
+
+        def page(**kwargs):
+            return paths(index.run_query(snapshot_index, index.Query(**kwargs)))
+
+        assert page() == [f"f{i:02d}" for i in range(10)]
+        assert page(offset=3, limit=2) == ["f03", "f04"]
+        assert page(offset=8, limit=5) == ["f08", "f09"]
+        assert page(offset=20) == []
+        assert page(limit=0) == []
+        assert page(top=4, offset=1, limit=2) == ["f08", "f07"]
+
+
+def test_empty_snapshot(tmp_path):
+    with make_index(tmp_path, []) as snapshot_index:
+        assert len(snapshot_index) == 0
+        assert snapshot_index.prefix_range("a") == (0, 0)
+        assert snapshot_index.size_range(1, 10) == (0, 0)
+        assert list(index.run_query(snapshot_index, index.Query())) == []
+        assert list(index.run_query(snapshot_index, index.Query(top=5))) == []
+
+
+def test_stale_index_is_rebuilt(tmp_path, storage_home):
+    write_snapshot([entry("a", 1)], tmp_path, "snap")
+    write_snapshot([entry("a", 1), entry("b", 2)], tmp_path, "snap")
+    with index.open_index("snap") as snapshot_index:
+        assert len(snapshot_index) == 2
+    # no temporary build directories are left behind
+    assert [p.name for p in (storage_home / "index").iterdir()] == ["snap"]
+
+
+def test_name_with_separator_is_rejected_before_writing(tmp_path, storage_home):
+    with pytest.raises(InvalidSnapshotNameError):
+        write_snapshot([entry("a")], tmp_path, "/tmp/x")
+    with pytest.raises(InvalidSnapshotNameError):
+        write_snapshot([entry("a")], tmp_path, "sub/x")
+    assert list(storage_home.glob("**/*.json")) == []
+
+
+def test_name_starting_with_dot_is_rejected(tmp_path):
+    for name in (".", "..", ".hidden"):
+        with pytest.raises(InvalidSnapshotNameError):
+            write_snapshot([entry("a")], tmp_path, name)
+
+
+def test_index_of_a_similarly_named_snapshot_survives(tmp_path):
+    write_snapshot([entry("x", 1)], tmp_path, "a.tmp")
+    write_snapshot([entry("y", 2)], tmp_path, "a")
+    write_snapshot([entry("z", 3)], tmp_path, "a")
+    with index.open_index("a.tmp") as snapshot_index:
+        assert snapshot_index.record(0) == entry("x", 1)
+
+
+def test_show_with_a_path_as_name_deletes_nothing(tmp_path, monkeypatch):
+    # a directory next to a .json file: an unchecked name would index (and replace) it
+    victim = tmp_path / "victim"
+    victim.mkdir()
+    (victim / "keep.txt").write_text("keep")
+    (tmp_path / "victim.json").write_text('{"files": []}')
+
+    monkeypatch.setattr("sys.argv", ["safe-fs-snapshot", "show", str(victim)])
+    assert cli.main() == 1
+    assert [p.name for p in victim.iterdir()] == ["keep.txt"]
+
+
+@pytest.mark.parametrize("name", ["/tmp/x", "../x", "../../x", "a/../b", "a\\b"])
+def test_read_paths_reject_bad_names(name):
+    for read in (index.open_index, index.get_index_dir, snapshot.load_snapshot):
+        with pytest.raises(InvalidSnapshotNameError):
+            read(name)
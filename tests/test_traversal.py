@@ -0,0 +1,165 @@
+import asyncio
+import os
+
+import pytest
+
+from safe_fs_snapshot import api, snapshot, traversal
+from safe_fs_snapshot.traversal import ScanRoot, TraversalPolicy
+
+FOLLOW = TraversalPolicy(follow_symlinks=True)
+
+
+# run the sync and the async scan and check they agree
+def scan(root, policy=None):
+    warnings = []
+    files = snapshot.create_snapshot(root, policy, on_warning=warnings.append)
+    async_warnings = []
+    async_files = asyncio.run(api.create_snapshot_async(root, policy, on_warning=async_warnings.append))
+    assert async_files == files
+    assert sorted(async_warnings) == sorted(warnings)
+    return {f["relative_path"]: f for f in files}, warnings
+
+
+def test_symlinks_are_recorded_not_followed_by_default(tmp_path):
+    (tmp_path / "real").mkdir()
+    (tmp_path / "real" / "f").write_text("hello")
+    (tmp_path / "dir_link").symlink_to("real")
+    (tmp_path / "file_link").symlink_to("real/f")
+
+    files, warnings = scan(tmp_path)
+
+    assert set(files) == {"real/f", "dir_link", "file_link"}
+    assert files["dir_link"]["type"] == "symlink"
+    assert files["dir_link"]["target"] == "real"
+    assert files["file_link"]["target"] == "real/f"
+    assert "type" not in files["real/f"]
+    assert warnings == []
+
+
+@pytest.mark.parametrize("policy", [None, FOLLOW])
+def test_dangling_symlink_is_recorded(tmp_path, policy):
+    (tmp_path / "dangling").symlink_to("nowhere")
+
+    files, warnings = scan(tmp_path, policy)
+
+    assert files["dangling"]["type"] == "symlink"
+    assert files["dangling"]["target"] == "nowhere"
+    assert warnings == []
+
+
+def test_symlink_loop_is_scanned_once(tmp_path):
+    (tmp_path / "real").mkdir()
+    (tmp_path / "real" / "f").write_text("x")
+    (tmp_path / "real" / "up").symlink_to("..")
+
+    files, warnings = scan(tmp_path, FOLLOW)
+
+    assert set(files) == {"real/f"}
+    assert warnings == [f"already visited (symlink loop or repeated mount), skipping: {tmp_path / 'real' / 'up'}"]
+
+
+@pytest.mark.parametrize("alias, real", [("alias", "real"), ("z_alias", "a_real"), ("a_alias", "z_real")])
+def test_real_directory_wins_over_symlink_alias(tmp_path, alias, real):
+    (tmp_path / real / "sub").mkdir(parents=True)
+    (tmp_path / real / "sub" / "f").write_text("x")
+    (tmp_path / alias).symlink_to(real)
+
+    files, warnings = scan(tmp_path, FOLLOW)
+
+    assert set(files) == {f"{real}/sub/f"}
+    assert warnings == [f"already visited (symlink loop or repeated mount), skipping: {tmp_path / alias}"]
+
+
+def test_symlinked_directories_go_in_path_order(tmp_path):
+    outside = tmp_path / "outside"
+    (outside / "d").mkdir(parents=True)
+    (outside / "d" / "f").write_text("x")
+    root = tmp_path / "root"
+    (root / "b").mkdir(parents=True)
+    (root / "b" / "link").symlink_to(outside / "d")
+    (root / "a_link").symlink_to(outside / "d")
+
+    files, _ = scan(root, FOLLOW)
+
+    assert set(files) == {"a_link/f"}
+
+
+def test_hardlinks_marked_in_path_order(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "z").write_text("data")
+    os.link(tmp_path / "sub" / "z", tmp_path / "b")
+    os.link(tmp_path / "sub" / "z", tmp_path / "a")
+
+    files, _ = scan(tmp_path)
+
+    assert "type" not in files["a"]
+    assert files["b"]["type"] == files["sub/z"]["type"] == "hardlink"
+    assert files["b"]["link_to"] == files["sub/z"]["link_to"] == "a"
+    assert files["b"]["size"] == 4
+
+
+def test_followed_symlink_to_single_link_file(tmp_path):
+    (tmp_path / "z").mkdir()
+    (tmp_path / "z" / "target").write_text("data")
+    (tmp_path / "b_link2").symlink_to("z/target")
+
+    files, _ = scan(tmp_path, FOLLOW)
+
+    # the real name keeps the full entry even though the symlink sorts first
+    assert "type" not in files["z/target"]
+    assert files["b_link2"]["type"] == "hardlink"
+    assert files["b_link2"]["link_to"] == "z/target"
+
+
+def make_root(path, device_offset=0, **policy):
+    stats = path.stat()
+    return ScanRoot(path, stats.st_dev + device_offset, stats.st_ino, TraversalPolicy(**policy), frozenset())
+
+
+def test_one_file_system_skips_other_devices(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "f").write_text("x")
+
+    # pretend the root is on another device than everything under it
+    other_device = make_root(tmp_path, device_offset=1, one_file_system=True)
+    result = snapshot.scan_directory(tmp_path, other_device)
+    assert result.subdirectories == []
+    assert [f["relative_path"] for f in result.files] == ["f"]
+
+    same_device = make_root(tmp_path, one_file_system=True)
+    assert [path for path, _, _ in snapshot.scan_directory(tmp_path, same_device).subdirectories] == [tmp_path / "sub"]
+
+    # without the flag the device doesn't matter
+    any_device = make_root(tmp_path, device_offset=1)
+    assert len(snapshot.scan_directory(tmp_path, any_device).subdirectories) == 1
+
+
+def test_pseudo_filesystem_devices_are_skipped(tmp_path):
+    (tmp_path / "sub").mkdir()
+    root = make_root(tmp_path)
+    skipping = ScanRoot(root.path, root.device, root.inode, root.policy, frozenset({root.device}))
+    assert snapshot.scan_directory(tmp_path, skipping).subdirectories == []
+
+
+MOUNTINFO = """\
+22 1 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:5 - proc proc rw
+23 1 0:22 / /sys rw,nosuid shared:6 master:1 - sysfs sysfs rw
+24 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw,errors=remount-ro
+25 23 0:23 / /sys/fs/cgroup ro,nosuid - cgroup2 cgroup2 rw
+26 1 0:24 / /mnt/with\\040space rw - tmpfs tmpfs rw
+garbage line without separator
+27 1 x:y / /bad rw - proc proc rw
+"""
+
+
+def test_read_pseudo_devices(tmp_path, monkeypatch):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO)
+    monkeypatch.setattr(traversal, "MOUNTINFO_PATH", mountinfo)
+
+    assert traversal.read_pseudo_devices() == {os.makedev(0, 21), os.makedev(0, 22), os.makedev(0, 23)}
+
+
+def test_read_pseudo_devices_without_mountinfo(tmp_path, monkeypatch):
+    monkeypatch.setattr(traversal, "MOUNTINFO_PATH", tmp_path / "missing")
+    assert traversal.read_pseudo_devices() == frozenset()